@@ -321,9 +321,12 @@ class Database:
         """Read and parse KCD data from given file-like object and add the
         parsed data to the database.
 
+        The data is parsed incrementally while it is read.
+
         """
 
-        self.add_kcd_string(fp.read())
+        self._add_kcd_database(
+            kcd.load_string(fp, self._strict, sort_signals=self._sort_signals))
 
     def add_kcd_file(self,
                      filename: StringPathLike,
@@ -344,8 +347,10 @@ class Database:
 
         """
 
-        database = kcd.load_string(string, self._strict, sort_signals=self._sort_signals)
+        self._add_kcd_database(
+            kcd.load_string(string, self._strict, sort_signals=self._sort_signals))
 
+    def _add_kcd_database(self, database: InternalDatabase) -> None:
         self._messages += database.messages
         self._nodes = database.nodes
         self._buses = database.buses
@@ -439,8 +444,11 @@ class Database:
                                sort_choices=sort_choices,
                                shorten_long_names=shorten_long_names)
 
-    def as_kcd_string(self, *, sort_signals:type_sort_signals=SORT_SIGNALS_DEFAULT) -> str:
+    def as_kcd_string(self, *,
+                      sort_signals:type_sort_signals=SORT_SIGNALS_DEFAULT,
+                      pretty:bool=True) -> str:
         """Return the database as a string formatted as a KCD file.
+           pretty defines whether to indent the elements one per line
 
         """
         if not self._sort_signals and sort_signals == SORT_SIGNALS_DEFAULT:
@@ -451,7 +459,8 @@ class Database:
                                                 self._buses,
                                                 self._version,
                                                 self._dbc),
-                               sort_signals=sort_signals)
+                               sort_signals=sort_signals,
+                               pretty=pretty)
 
     def as_sym_string(self, *, sort_signals:type_sort_signals=SORT_SIGNALS_DEFAULT) -> str:
         """Return the database as a string formatted as a SYM file.
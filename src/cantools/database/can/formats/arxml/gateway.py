@@ -1,5 +1,9 @@
 # A CAN Gateway
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Tuple
+
+# Status of a target while resolving PDU triggering routes
+_VISITED = 1
+_RESOLVED = 2
 
 class Gateway:
     """A CAN gateway.
@@ -42,35 +46,58 @@ class Gateway:
         for gateway in gateways:
             for source, target in gateway._pdu_triggering_routes:
                 # NOTE: if multiple sources can lead to the same target
-                # we take the lexicographically smaller source pair
+                # we take the lexicographically larger source pair
                 source_pair = (source, gateway.name)
                 if target_to_source.get(target, source_pair) <= source_pair:
                     target_to_source[target] = source_pair
         
-        targets = target_to_source.keys()
-        result: Dict[str, Tuple[str, List[str]]] = {}
+        # a target is visited while its route is being resolved and stays
+        # visited if the route runs into a loop. once the route is
+        # resolved, the target is resolved and its route is cached.
+        status: Dict[str, int] = {}
+        resolved: Dict[str, Tuple[str, List[str]]] = {}
+        prev_source_pair: Optional[Tuple[str, str]]
         
-        for target in targets:
-            gateways_path: List[str] = []
-            seen_sources: Set[str] = set([target])
+        for target, prev_source_pair in target_to_source.items():
+            # targets and gateways traversed walking back from the target
+            walked: List[Tuple[str, str]] = []
+            # gateways path of an already resolved route that the
+            # route of the target passes through
+            resolved_path: List[str] = []
             
-            source = None
-            prev_source_pair = target_to_source.get(target, None)
-
+            source = target
+            loop_detected = False
             while prev_source_pair is not None:
-                source, gateway = prev_source_pair
-                if source in seen_sources:
-                    # loop detected: stop resolution and do not store any route
-                    source = None
+                source_status = status.get(source)
+                if source_status == _RESOLVED:
+                    # the rest of the route has already been resolved
+                    source, resolved_path = resolved[source]
+                    break
+                elif source_status == _VISITED:
+                    # loop detected, now or while resolving another
+                    # route: stop resolution and do not store any route
+                    loop_detected = True
                     break
                 else:
-                    seen_sources.add(source)
-                    gateways_path.append(gateway)
+                    status[source] = _VISITED
+                    next_source, gateway_name = prev_source_pair
+                    walked.append((source, gateway_name))
+                    source = next_source
                     prev_source_pair = target_to_source.get(source, None)
 
-            if source is not None:
-                gateways_path.reverse()
-                result[target] = (source, gateways_path)
+            if not loop_detected:
+                # resolve the route of every target walked through
+                gateways_path = resolved_path
+                for walked_target, gateway_name in reversed(walked):
+                    gateways_path = gateways_path + [gateway_name]
+                    status[walked_target] = _RESOLVED
+                    resolved[walked_target] = (source, gateways_path)
+
+        result: Dict[str, Tuple[str, List[str]]] = {
+            target: resolved[target]
+            for target in target_to_source
+            if target in resolved
+        }
 
         return result
 
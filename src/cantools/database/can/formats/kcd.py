@@ -1,8 +1,10 @@
 # Load and dump a CAN database in KCD format.
 
+import io
 import logging
+import sys
 from collections import defaultdict
-from typing import Dict, Optional
+from typing import IO, Dict, Optional, Union
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element, SubElement
 
@@ -26,33 +28,104 @@ LOGGER = logging.getLogger(__name__)
 # The KCD XML namespace.
 NAMESPACE = 'http://kayak.2codeornot2code.org/1.0'
 NAMESPACES = {'ns': NAMESPACE}
+NS = f'{{{NAMESPACE}}}'
+
+ROOT_TAG = f'{NS}NetworkDefinition'
+
+# Fully qualified element tags, so that no namespace prefix has to be
+# resolved when searching for elements.
+_TAG_NODE = NS + 'Node'
+_TAG_DOCUMENT = NS + 'Document'
+_TAG_BUS = NS + 'Bus'
+_TAG_MESSAGE = NS + 'Message'
+_TAG_MULTIPLEX = NS + 'Multiplex'
+_TAG_MUXGROUP = NS + 'MuxGroup'
+_TAG_SIGNAL = NS + 'Signal'
+_TAG_VALUE = NS + 'Value'
+_TAG_NOTES = NS + 'Notes'
+_TAG_LABELSET = NS + 'LabelSet'
+_TAG_LABEL = NS + 'Label'
+_TAG_CONSUMER = NS + 'Consumer'
+_TAG_PRODUCER = NS + 'Producer'
+_TAG_NODEREF = NS + 'NodeRef'
+
+# Supported attributes of signal, signal value and message elements.
+_SIGNAL_ATTRIBUTES = frozenset(['name', 'offset', 'length', 'endianess'])
+_VALUE_ATTRIBUTES = frozenset(['min', 'max', 'slope', 'intercept', 'unit', 'type'])
+_MESSAGE_ATTRIBUTES = frozenset(['name', 'id', 'format', 'length', 'interval'])
+
+# Number of characters fed to the XML parser at a time.
+_CHUNK_SIZE = 64 * 1024
+
+
+def _iterparse(source):
+    """Incrementally parse given KCD string, bytes or file-like object
+    and yield ``(event, element)`` tuples as elements are started and
+    ended.
 
-ROOT_TAG = f'{{{NAMESPACE}}}NetworkDefinition'
+    """
+
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    elif isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+
+    while True:
+        chunk = source.read(_CHUNK_SIZE)
+
+        if not chunk:
+            break
+
+        parser.feed(chunk)
+        yield from parser.read_events()
+
+    parser.close()
+    yield from parser.read_events()
+
+
+def _release_element(element, parent):
+    """Free given loaded element and remove it from its parent.
+
+    """
+
+    element.clear()
+    parent.remove(element)
 
 
 def _start_bit(offset, byte_order):
     if byte_order == 'big_endian':
-        return (8 * (offset // 8) + (7 - (offset % 8)))
+        # Same as 8 * (offset // 8) + (7 - (offset % 8)).
+        return offset ^ 7
     else:
         return offset
 
 
-def _get_node_name_by_id(nodes, node_id):
-    for node in nodes:
-        if node['id'] == node_id:
-            return node['name']
+def _debug_unsupported_attributes(attrib, supported, kind):
+    for key in attrib:
+        if key not in supported:
+            LOGGER.debug("Ignoring unsupported %s attribute '%s'.", kind, key)
 
 
-def _load_signal_element(signal, nodes):
-    """Load given signal element and return a signal object.
+def _get_num(attrib, key, default=None):
+    value = attrib.get(key)
+
+    if value is None:
+        return default
+    else:
+        return num(value)
+
+
+def _load_signal_element(signal):
+    """Load given signal element and return a signal object. Receivers
+    are node ids until resolved by _resolve_node_refs().
 
     """
 
     # Default values.
-    name = None
-    offset = None
-    length = 1
-    byte_order = 'little_endian'
+    labels = None
+    notes = None
     is_signed = False
     is_float = False
     minimum = None
@@ -60,71 +133,74 @@ def _load_signal_element(signal, nodes):
     slope = 1
     intercept = 0
     unit = None
-    labels = None
-    notes = None
     receivers = []
 
     # Signal XML attributes.
-    for key, value in signal.attrib.items():
-        if key == 'name':
-            name = value
-        elif key == 'offset':
-            offset = int(value)
-        elif key == 'length':
-            length = int(value)
-        elif key == 'endianess':
-            byte_order = f'{value}_endian'
-        else:
-            LOGGER.debug("Ignoring unsupported signal attribute '%s'.", key)
+    attrib = signal.attrib
+    debug = LOGGER.isEnabledFor(logging.DEBUG)
+
+    if debug:
+        _debug_unsupported_attributes(attrib, _SIGNAL_ATTRIBUTES, 'signal')
+
+    name = attrib.get('name')
+    offset = attrib.get('offset')
+
+    if offset is not None:
+        offset = int(offset)
+
+    length = attrib.get('length')
+    length = 1 if length is None else int(length)
+    endianess = attrib.get('endianess')
+
+    if endianess is None:
+        byte_order = 'little_endian'
+    else:
+        byte_order = sys.intern(f'{endianess}_endian')
 
     # Value XML element.
-    value = signal.find('ns:Value', NAMESPACES)
+    value = signal.find(_TAG_VALUE)
 
     if value is not None:
-        for key, _value in value.attrib.items():
-            if key == 'min':
-                minimum = num(_value)
-            elif key == 'max':
-                maximum = num(_value)
-            elif key == 'slope':
-                slope = num(_value)
-            elif key == 'intercept':
-                intercept = num(_value)
-            elif key == 'unit':
-                unit = _value
-            elif key == 'type':
-                is_signed = (_value == 'signed')
-                is_float = (_value in ['single', 'double'])
-            else:
-                LOGGER.debug("Ignoring unsupported signal value attribute '%s'.",
-                             key)
+        value_attrib = value.attrib
+
+        if debug:
+            _debug_unsupported_attributes(value_attrib,
+                                          _VALUE_ATTRIBUTES,
+                                          'signal value')
+
+        type_name = value_attrib.get('type')
+        is_signed = (type_name == 'signed')
+        is_float = type_name in ['single', 'double']
+        minimum = _get_num(value_attrib, 'min')
+        maximum = _get_num(value_attrib, 'max')
+        slope = _get_num(value_attrib, 'slope', 1)
+        intercept = _get_num(value_attrib, 'intercept', 0)
+        unit = value_attrib.get('unit')
 
     # Notes.
     try:
-        notes = signal.find('ns:Notes', NAMESPACES).text
+        notes = signal.find(_TAG_NOTES).text
     except AttributeError:
         pass
 
     # Label set XML element.
-    label_set = signal.find('ns:LabelSet', NAMESPACES)
+    label_set = signal.find(_TAG_LABELSET)
 
     if label_set is not None:
-        labels = {}
-
-        for label in label_set.iterfind('ns:Label', NAMESPACES):
-            label_value = int(label.attrib['value'])
-            label_name = label.attrib['name']
-            labels[label_value] = NamedSignalValue(label_value, label_name)
+        labels = {
+            (label_value := int(attrib['value'])): NamedSignalValue(label_value,
+                                                                    attrib['name'])
+            for attrib in (label.attrib for label in label_set.iterfind(_TAG_LABEL))
+        }
 
         # TODO: Label groups.
 
     # Receivers.
-    consumer = signal.find('ns:Consumer', NAMESPACES)
+    consumer = signal.find(_TAG_CONSUMER)
 
     if consumer is not None:
-        for receiver in consumer.iterfind('ns:NodeRef', NAMESPACES):
-            receivers.append(_get_node_name_by_id(nodes,
-                                                  receiver.attrib['id']))
+        for receiver in consumer.iterfind(_TAG_NODEREF):
+            receivers.append(receiver.attrib['id'])
 
     conversion = BaseConversion.factory(
         scale=slope,
@@ -147,83 +223,94 @@ def _load_signal_element(signal, nodes):
                   )
 
 
-def _load_multiplex_element(mux, nodes):
+def _load_multiplex_element(mux):
     """Load given multiplex elements and its signals and return list of signals.
 
     """
 
-    mux_signal = _load_signal_element(mux, nodes)
+    mux_signal = _load_signal_element(mux)
     mux_signal.is_multiplexer = True
     signals = [mux_signal]
 
-    for mux_group in mux.iterfind('ns:MuxGroup', NAMESPACES):
+    # Share one multiplexer name string among the multiplexed signals
+    # of all messages. A multiplexer may have no name.
+    multiplexer_signal = mux_signal.name
+
+    if multiplexer_signal is not None:
+        multiplexer_signal = sys.intern(multiplexer_signal)
+
+    for mux_group in mux.iterfind(_TAG_MUXGROUP):
         multiplexer_id = mux_group.attrib['count']
 
-        for signal_element in mux_group.iterfind('ns:Signal', NAMESPACES):
-            signal = _load_signal_element(signal_element, nodes)
+        for signal_element in mux_group.iterfind(_TAG_SIGNAL):
+            signal = _load_signal_element(signal_element)
             signal.multiplexer_ids = [int(multiplexer_id)]
-            signal.multiplexer_signal = mux_signal.name
+            signal.multiplexer_signal = multiplexer_signal
             signals.append(signal)
 
     return signals
 
 
-def _load_message_element(message, bus_name: Optional["Bus.BusName"], nodes, strict, sort_signals):
-    """Load given message element and return a message object.
+def _load_message_element(message, bus_name: Optional["Bus.BusName"], strict, sort_signals):
+    """Load given message element and return a message object. Senders
+    and signal receivers are node ids until resolved by
+    _resolve_node_refs().
 
     """
 
     # Default values.
-    name = None
-    frame_id = None
-    is_extended_frame = False
     notes = None
-    length = 'auto'
-    interval = None
     senders = []
 
     # Message XML attributes.
-    for key, value in message.attrib.items():
-        if key == 'name':
-            name = value
-        elif key == 'id':
-            frame_id = int(value, 0)
-        elif key == 'format':
-            is_extended_frame = (value == 'extended')
-        elif key == 'length':
-            length = value  # 'auto' needs additional processing after knowing all signals
-        elif key == 'interval':
-            interval = int(value)
-        else:
-            LOGGER.debug("Ignoring unsupported message attribute '%s'.", key)
-            # TODO: triggered, count, remote
+    attrib = message.attrib
+    # TODO: triggered, count, remote
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        _debug_unsupported_attributes(attrib, _MESSAGE_ATTRIBUTES, 'message')
+
+    name = attrib.get('name')
+    frame_id = attrib.get('id')
+
+    if frame_id is not None:
+        frame_id = int(frame_id, 0)
+
+    is_extended_frame = (attrib.get('format') == 'extended')
+    # 'auto' needs additional processing after knowing all signals
+    length = attrib.get('length', 'auto')
+    interval = attrib.get('interval')
+
+    if interval is not None:
+        interval = int(interval)
 
     # Comment.
     try:
-        notes = message.find('ns:Notes', NAMESPACES).text
+        notes = message.find(_TAG_NOTES).text
     except AttributeError:
         pass
 
     # Senders.
-    producer = message.find('ns:Producer', NAMESPACES)
+    producer = message.find(_TAG_PRODUCER)
 
     if producer is not None:
-        for sender in producer.iterfind('ns:NodeRef', NAMESPACES):
-            senders.append(_get_node_name_by_id(nodes,
-                                                sender.attrib['id']))
+        for sender in producer.iterfind(_TAG_NODEREF):
+            senders.append(sender.attrib['id'])
 
-    # Find all signals in this message.
+    # Find all signals in this message, multiplexed ones first.
     signals = []
+    plain_signals = []
 
-    for mux in message.iterfind('ns:Multiplex', NAMESPACES):
-        signals += _load_multiplex_element(mux, nodes)
+    for child in message:
+        if child.tag == _TAG_MULTIPLEX:
+            signals += _load_multiplex_element(child)
+        elif child.tag == _TAG_SIGNAL:
+            plain_signals.append(_load_signal_element(child))
 
-    for signal in message.iterfind('ns:Signal', NAMESPACES):
-        signals.append(_load_signal_element(signal, nodes))
+    signals += plain_signals
 
     if length == 'auto':
         if signals:
-            last_signal = sorted(signals, key=start_bit)[-1]
+            # Of signals with equal start bits, the last one is used.
+            last_signal = max(reversed(signals), key=start_bit)
             length = (start_bit(last_signal) + last_signal.length + 7) // 8
         else:
             length = 0
@@ -245,48 +332,62 @@ def _load_message_element(message, bus_name: Optional["Bus.BusName"], nodes, str
                    sort_signals=sort_signals)
 
 
-def _indent_xml(element, indent, level=0):
-    i = "\n" + level * indent
+def _indent_xml(element, indent):
+    """Indent given element and its subelements in place, using `indent`
+    once per nesting level.
 
-    if len(element):
-        if not element.text or not element.text.strip():
-            element.text = i + indent
+    """
 
-        if not element.tail or not element.tail.strip():
-            element.tail = i
+    if len(element) and (not element.tail or not element.tail.strip()):
+        element.tail = "\n"
 
-        for child in element:
-            _indent_xml(child, indent, level + 1)
+    if hasattr(ElementTree, 'indent'):
+        ElementTree.indent(element, space=indent)
+        return
 
-        if not child.tail or not child.tail.strip():
-            child.tail = i
-    else:
-        if level and (not element.tail or not element.tail.strip()):
-            element.tail = i
+    stack = [(element, "\n")]
 
+    while stack:
+        element, i = stack.pop()
 
-def _dump_notes(parent, comment):
-    notes = SubElement(parent, 'Notes')
-    notes.text = comment
+        if not len(element):
+            continue
 
+        child_i = i + indent
 
-def _dump_signal(signal, node_refs, signal_element):
-    signal_element.set('name', signal.name)
+        if not element.text or not element.text.strip():
+            element.text = child_i
+
+        for child in element:
+            if not child.tail or not child.tail.strip():
+                child.tail = child_i
 
+            stack.append((child, child_i))
+
+        if not child.tail.strip():
+            child.tail = i
+
+
+def _dump_signal(signal, node_refs, signal_element):
     offset = _start_bit(signal.start, signal.byte_order)
-    signal_element.set('offset', str(offset))
+    attrib = {
+        'name': signal.name,
+        'offset': str(offset)
+    }
 
     # Length.
     if signal.length != 1:
-        signal_element.set('length', str(signal.length))
+        attrib['length'] = str(signal.length)
 
     # Byte order.
     if signal.byte_order != 'little_endian':
-        signal_element.set('endianess', signal.byte_order[:-7])
+        attrib['endianess'] = signal.byte_order[:-7]
+
+    signal_element.attrib.update(attrib)
 
     # Comment.
     if signal.comment is not None:
-        _dump_notes(signal_element, signal.comment)
+        SubElement(signal_element, 'Notes').text = signal.comment
 
     # Receivers.
     if signal.receivers:
@@ -295,25 +396,25 @@ def _dump_signal(signal, node_refs, signal_element):
         for receiver in signal.receivers:
             SubElement(consumer,
                        'NodeRef',
-                       id=str(node_refs[receiver]))
+                       id=node_refs[receiver])
 
     # Value.
-    value = Element('Value')
+    value_attrib = {}
 
     if signal.minimum is not None:
-        value.set('min', str(signal.minimum))
+        value_attrib['min'] = str(signal.minimum)
 
     if signal.maximum is not None:
-        value.set('max', str(signal.maximum))
+        value_attrib['max'] = str(signal.maximum)
 
     if signal.scale != 1:
-        value.set('slope', str(signal.scale))
+        value_attrib['slope'] = str(signal.scale)
 
     if signal.offset != 0:
-        value.set('intercept', str(signal.offset))
+        value_attrib['intercept'] = str(signal.offset)
 
     if signal.unit is not None:
-        value.set('unit', signal.unit)
+        value_attrib['unit'] = signal.unit
 
     if signal.is_float:
         if signal.length == 32:
@@ -326,10 +427,10 @@ def _dump_signal(signal, node_refs, signal_element):
         type_name = None
 
     if type_name is not None:
-        value.set('type', type_name)
+        value_attrib['type'] = type_name
 
-    if value.attrib:
-        signal_element.append(value)
+    if value_attrib:
+        signal_element.append(Element('Value', value_attrib))
 
     # Label set.
     if signal.choices:
@@ -352,16 +453,7 @@ def _dump_mux_group(multiplexer_id,
                      node_refs,
                      SubElement(mux_group, 'Signal'))
 
-def _dump_mux_groups(multiplexer_name, signals, node_refs, parent):
-    signals_per_count = defaultdict(list)
-
-    for signal in signals:
-        if signal.multiplexer_signal != multiplexer_name:
-            continue
-
-        multiplexer_id = signal.multiplexer_ids[0]
-        signals_per_count[multiplexer_id].append(signal)
-
+def _dump_mux_groups(signals_per_count, node_refs, parent):
     for multiplexer_id, multiplexed_signals in signals_per_count.items():
         _dump_mux_group(multiplexer_id,
                         multiplexed_signals,
@@ -385,7 +477,7 @@ def _dump_message(message, bus, node_refs, sort_signals):
 
     # Comment.
     if message.comment is not None:
-        _dump_notes(message_element, message.comment)
+        SubElement(message_element, 'Notes').text = message.comment
 
     # Senders.
     if message.senders:
@@ -394,7 +486,7 @@ def _dump_message(message, bus, node_refs, sort_signals):
         for sender in message.senders:
             SubElement(producer,
                        'NodeRef',
-                       id=str(node_refs[sender]))
+                       id=node_refs[sender])
 
     # Signals.
     if sort_signals:
@@ -402,17 +494,29 @@ def _dump_message(message, bus, node_refs, sort_signals):
     else:
         signals = message.signals
 
+    # Signals directly in the message, and multiplexed signals per
+    # multiplexer and multiplexer id.
+    message_signals = []
+    mux_buckets = defaultdict(lambda: defaultdict(list))
+
     for signal in signals:
+        if signal.multiplexer_signal is not None:
+            multiplexer_id = signal.multiplexer_ids[0]
+            mux_buckets[signal.multiplexer_signal][multiplexer_id].append(signal)
+
+        if signal.is_multiplexer or signal.multiplexer_ids is None:
+            message_signals.append(signal)
+
+    for signal in message_signals:
         if signal.is_multiplexer:
             signal_element = SubElement(message_element, 'Multiplex')
             _dump_signal(signal,
                          node_refs,
                          signal_element)
-            _dump_mux_groups(signal.name,
-                             signals,
+            _dump_mux_groups(mux_buckets.get(signal.name, {}),
                              node_refs,
                              signal_element)
-        elif signal.multiplexer_ids is None:
+        else:
             _dump_signal(signal,
                          node_refs,
                          SubElement(message_element, 'Signal'))
@@ -425,8 +529,9 @@ def _dump_version(version, parent):
 
 def _dump_nodes(nodes, node_refs, parent):
     for node_id, node in enumerate(nodes, 1):
-        SubElement(parent, 'Node', id=str(node_id), name=node.name)
-        node_refs[node.name] = node_id
+        node_ref = str(node_id)
+        SubElement(parent, 'Node', id=node_ref, name=node.name)
+        node_refs[node.name] = node_ref
 
 
 def _dump_messages(messages, node_refs, parent, sort_signals):
@@ -436,14 +541,19 @@ def _dump_messages(messages, node_refs, parent, sort_signals):
         _dump_message(message, bus, node_refs, sort_signals)
 
 
-def dump_string(database: InternalDatabase, *, sort_signals:type_sort_signals=SORT_SIGNALS_DEFAULT) -> str:
-    """Format given database in KCD file format.
+def dump_string(database: InternalDatabase,
+                *,
+                sort_signals: type_sort_signals = SORT_SIGNALS_DEFAULT,
+                pretty: bool = True) -> str:
+    """Format given database in KCD file format. The elements are
+    indented one per line if `pretty` is ``True``, and written without
+    any whitespace between them otherwise.
 
     """
     if sort_signals == SORT_SIGNALS_DEFAULT:
         sort_signals = None
 
-    node_refs: Dict[str, int] = {}
+    node_refs: Dict[str, str] = {}
 
     attrib = {
         'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
@@ -456,44 +566,85 @@ def dump_string(database: InternalDatabase, *, sort_signals:type_sort_signals=SO
     _dump_nodes(database.nodes, node_refs, network_definition)
     _dump_messages(database.messages, node_refs, network_definition, sort_signals)
 
-    _indent_xml(network_definition, '  ')
+    if pretty:
+        _indent_xml(network_definition, '  ')
 
     return ElementTree.tostring(network_definition, encoding='unicode')
 
 
-def load_string(string:str, strict:bool=True, sort_signals:type_sort_signals=sort_signals_by_start_bit) -> InternalDatabase:
-    """Parse given KCD format string.
+def _resolve_node_refs(messages, node_name_by_id):
+    """Replace the node ids of given loaded messages' senders and signal
+    receivers with node names, once all nodes are known.
 
     """
 
-    root = ElementTree.fromstring(string)
+    for message in messages:
+        senders = message.senders
+        senders[:] = [node_name_by_id.get(node_id) for node_id in senders]
+
+        for signal in message.signals:
+            receivers = signal.receivers
+            receivers[:] = [
+                node_name_by_id.get(node_id) for node_id in receivers
+            ]
+
+
+def load_string(string: Union[str, bytes, IO[str], IO[bytes]],
+                strict: bool = True,
+                sort_signals: type_sort_signals = sort_signals_by_start_bit) -> InternalDatabase:
+    """Parse given KCD format string, bytes or file-like object opened
+    in text or binary mode.
 
-    # Should be replaced with a validation using the XSD file.
-    if root.tag != ROOT_TAG:
-        raise ValueError(f'Expected root element tag {ROOT_TAG}, but got {root.tag}.')
+    The document is parsed incrementally, and each message element is
+    freed once loaded.
+
+    """
 
-    nodes = [node.attrib for node in root.iterfind('./ns:Node', NAMESPACES)]
+    nodes = []
+    node_name_by_id: Dict[str, str] = {}
     buses = []
     messages = []
-
-    try:
-        document = root.find('ns:Document', NAMESPACES)
-        version = document.attrib.get('version', None)  # type: ignore  # avoid mypy error: Item "None" of "Optional[Element]" has no attribute "attrib"
-    except AttributeError:
-        version = None
-
-    for bus in root.iterfind('ns:Bus', NAMESPACES):
-        bus_name = bus.attrib['name']
-        bus_baudrate = int(bus.get('baudrate', 500000))
-        bus_details = Bus(bus_name, baudrate=bus_baudrate)
-        buses.append(bus_details)
-
-        for message in bus.iterfind('ns:Message', NAMESPACES):
-            messages.append(_load_message_element(message,
-                                                  bus_details.name,
-                                                  nodes,
-                                                  strict,
-                                                  sort_signals))
+    version = None
+    bus = None
+    bus_name = None
+    depth = 0
+
+    for event, element in _iterparse(string):
+        if event == 'start':
+            depth += 1
+
+            if depth == 1:
+                # Should be replaced with a validation using the XSD file.
+                if element.tag != ROOT_TAG:
+                    raise ValueError(
+                        f'Expected root element tag {ROOT_TAG}, but got {element.tag}.')
+            elif depth == 2 and element.tag == _TAG_BUS:
+                bus = element
+                bus_name = element.attrib['name']
+                bus_baudrate = int(element.get('baudrate', 500000))
+                bus_details = Bus(bus_name, baudrate=bus_baudrate)
+                buses.append(bus_details)
+        else:
+            if depth == 2:
+                if element.tag == _TAG_NODE:
+                    node = dict(element.attrib)
+                    nodes.append(node)
+                    # The first node with a given id is referenced.
+                    node_name_by_id.setdefault(node['id'], node['name'])
+                elif element.tag == _TAG_DOCUMENT:
+                    version = element.attrib.get('version', None)
+                elif element.tag == _TAG_BUS:
+                    bus = None
+            elif depth == 3 and bus is not None and element.tag == _TAG_MESSAGE:
+                messages.append(_load_message_element(element,
+                                                      bus_name,
+                                                      strict,
+                                                      sort_signals))
+                _release_element(element, bus)
+
+            depth -= 1
+
+    _resolve_node_refs(messages, node_name_by_id)
 
     return InternalDatabase(messages,
                             [
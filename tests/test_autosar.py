@@ -5,6 +5,7 @@ import unittest
 import cantools
 import cantools.autosar
 from cantools.autosar.snakeauth import SnakeOilAuthenticator
+from cantools.database.can.formats.arxml.gateway import Gateway
 
 
 class CanToolsAutosarTest(unittest.TestCase):
@@ -175,5 +176,47 @@ class CanToolsAutosarTest(unittest.TestCase):
                                                                snake_auth,
                                                                0xdccc))
 
+    def test_gateway_pdu_triggering_routes(self):
+        def gateway(name, routes):
+            return Gateway(name, f'{name}Node', routes)
+
+        gateways = [
+            # shared chain prefix a -> b, with b's targets listed first
+            gateway('G2', [('b', 'c')]),
+            gateway('G3', [('b', 'd')]),
+            gateway('G1', [('a', 'b')]),
+            # self loop
+            gateway('G4', [('x', 'x')]),
+            # loop p -> q -> p and a chain leading into it
+            gateway('G5', [('p', 'q'), ('q', 'p'), ('p', 't')]),
+            # several sources feeding the same target
+            gateway('G6', [('u', 'z'), ('u', 'y')]),
+            gateway('G7', [('v', 'z'), ('u', 'y')]),
+            gateway('G8', [('s', 'z')]),
+        ]
+
+        self.assertEqual(
+            Gateway.get_pdu_triggering_routes(gateways),
+            {
+                'b': ('a', ['G1']),
+                'c': ('a', ['G1', 'G2']),
+                'd': ('a', ['G1', 'G3']),
+                # the lexicographically larger (source, gateway) pair
+                'z': ('v', ['G7']),
+                'y': ('u', ['G7']),
+            })
+
+        # a target fed by a loop is not routed, whichever is seen first
+        gateways = [
+            gateway('G1', [('p', 't')]),
+            gateway('G2', [('q', 'p')]),
+            gateway('G3', [('p', 'q')]),
+            gateway('G4', [('t', 'w')]),
+        ]
+
+        self.assertEqual(Gateway.get_pdu_triggering_routes(gateways), {})
+
+        self.assertEqual(Gateway.get_pdu_triggering_routes([]), {})
+
 if __name__ == '__main__':
     unittest.main()
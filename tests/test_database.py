@@ -1,4 +1,5 @@
 
+import io
 import logging
 import math
 import os
@@ -22,7 +23,7 @@ except ImportError:
 
 import cantools
 from cantools.database import Message, Signal, UnsupportedDatabaseFormatError
-from cantools.database.can.formats import dbc
+from cantools.database.can.formats import dbc, kcd
 
 
 class CanToolsDatabaseTest(unittest.TestCase):
@@ -1749,6 +1750,89 @@ class CanToolsDatabaseTest(unittest.TestCase):
             '{http://kayak.2codeornot2code.org/1.0}NetworkDefinition, but '
             'got WrongRootElement."')
 
+    def test_kcd_load_file_object(self):
+        filename = 'tests/files/kcd/the_homer.kcd'
+        expected = cantools.db.load_file(filename)
+
+        for mode in ['r', 'rb']:
+            with open(filename, mode) as fin:
+                db = kcd.load_string(fin)
+
+            self.assertEqual(db.version, expected.version)
+            self.assertEqual([node.name for node in db.nodes],
+                             [node.name for node in expected.nodes])
+            self.assertEqual([bus.name for bus in db.buses],
+                             [bus.name for bus in expected.buses])
+            self.assertEqual([message.name for message in db.messages],
+                             [message.name for message in expected.messages])
+
+    def test_kcd_load_declared_encoding(self):
+        string = (
+            '<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+            '<NetworkDefinition xmlns="http://kayak.2codeornot2code.org/1.0">\n'
+            '  <Bus name="Bus">\n'
+            '    <Message id="0x001" name="Message1">\n'
+            '      <Notes>N\u00f6te</Notes>\n'
+            '    </Message>\n'
+            '  </Bus>\n'
+            '</NetworkDefinition>\n'
+        )
+
+        encoded = string.encode('iso-8859-1')
+
+        for source in [string, encoded, io.BytesIO(encoded)]:
+            db = kcd.load_string(source)
+            self.assertEqual(db.messages[0].comment, 'N\u00f6te')
+
+    def test_kcd_load_unnamed_multiplexer(self):
+        string = (
+            '<NetworkDefinition xmlns="http://kayak.2codeornot2code.org/1.0">\n'
+            '  <Bus name="Bus">\n'
+            '    <Message id="0x001" name="Message1">\n'
+            '      <Multiplex offset="0" length="8">\n'
+            '        <MuxGroup count="1">\n'
+            '          <Signal name="S" offset="8" />\n'
+            '        </MuxGroup>\n'
+            '      </Multiplex>\n'
+            '    </Message>\n'
+            '  </Bus>\n'
+            '</NetworkDefinition>\n'
+        )
+
+        db = kcd.load_string(string, strict=False)
+
+        self.assertEqual([(signal.name, signal.multiplexer_signal)
+                          for signal in db.messages[0].signals],
+                         [(None, None), ('S', None)])
+
+    def test_kcd_load_nodes_after_bus(self):
+        filename = 'tests/files/kcd/dump.kcd'
+        expected = cantools.db.load_file(filename)
+
+        with open(filename) as fin:
+            string = fin.read()
+
+        node = '  <Node id="1" name="Node1" />\n'
+        string = string.replace(node, '').replace('  </Bus>\n',
+                                                  '  </Bus>\n' + node)
+        db = cantools.database.load_string(string, database_format='kcd')
+
+        self.assertEqual([node.name for node in db.nodes],
+                         ['Node2', 'Node3', 'Node1'])
+
+        for message, expected_message in zip(db.messages,
+                                             expected.messages):
+            self.assertEqual(message.senders, expected_message.senders)
+
+            for signal, expected_signal in zip(message.signals,
+                                               expected_message.signals):
+                self.assertEqual(signal.receivers, expected_signal.receivers)
+
+        self.assertEqual(db.get_message_by_name('Message1').senders,
+                         ['Node1'])
+        cantools.database.load_string(db.as_kcd_string(),
+                                      database_format='kcd')
+
     def test_jopp_5_0_sym(self):
         db = cantools.db.Database()
 
@@ -3944,7 +4028,15 @@ class CanToolsDatabaseTest(unittest.TestCase):
         db = cantools.database.load_file(filename)
 
         with open(filename) as fin:
-            self.assertEqual(db.as_kcd_string(), fin.read())
+            expected = fin.read()
+
+        self.assertEqual(db.as_kcd_string(), expected)
+
+        # Without indentation.
+        compact = db.as_kcd_string(pretty=False)
+        self.assertNotIn('\n', compact)
+        self.assertEqual(cantools.database.load_string(compact).as_kcd_string(),
+                         expected)
 
     def test_issue_62(self):
         """Test issue 62.
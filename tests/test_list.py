@@ -1,56 +1,50 @@
+import os
 import unittest
+from dataclasses import dataclass, field, replace
+from io import StringIO
+from typing import List, Tuple
 from unittest.mock import patch
 
+import cantools
 import cantools.subparsers.list as list_module
 
-try:
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
+_load_file = cantools.database.load_file
 
-class Args:
-
-    def __init__(self, input_file_name):
-        self.exclude_normal = False
-        self.exclude_extended = False
-        self.print_all = False
-        self.no_strict = False
-        self.skip_format_specifics = False
-        self.prune = True
-        self.input_file_name = (input_file_name, )
-        self.print_buses = False
-        self.print_nodes = False
-        self.items = []
-
-class CanToolsListTest(unittest.TestCase):
-    def test_dbc(self):
-        # Prepare mocks.
-        args = Args('tests/files/dbc/motohawk.dbc')
+# Only the quick smoke tests run by default. Set CANTOOLS_FULL_TESTS=1
+# to also compare the full listings (tox always does).
+_FULL_TESTS = os.environ.get('CANTOOLS_FULL_TESTS') == '1'
+_FULL_TESTS_REASON = 'set CANTOOLS_FULL_TESTS=1 to run the full listings'
 
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
 
-            # check make sure it behaves as expected
-            expected_output = """\
+@dataclass
+class Args:
+    input_file_name: Tuple[str, ...]
+    exclude_normal: bool = False
+    exclude_extended: bool = False
+    print_all: bool = False
+    no_strict: bool = False
+    skip_format_specifics: bool = False
+    prune: bool = True
+    print_buses: bool = False
+    print_nodes: bool = False
+    items: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        # _do_list() appends to the items list, so copies made with
+        # replace() must not share it.
+        self.items = list(self.items)
+
+
+_INPUT_MOTOHAWK = ('tests/files/dbc/motohawk.dbc', )
+_INPUT_ARXML3 = ('tests/files/arxml/system-3.2.3.arxml', )
+_INPUT_ARXML4 = ('tests/files/arxml/system-4.2.arxml', )
+_INPUT_KCD = ('tests/files/kcd/dump.kcd', )
+
+_EXPECTED_MOTOHAWK = """\
 ExampleMessage
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        # Prepare mocks.
-        args = Args('tests/files/dbc/motohawk.dbc')
-        args.print_all = True
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_MOTOHAWK_ALL = """\
 ExampleMessage:
   Comment[None]: Example message used as template in MotoHawk models.
   Sending ECUs: PCM1
@@ -100,38 +94,14 @@ ExampleMessage:
       Offset: 250 degK
       Scaling factor: 0.01 degK
 """
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-    def test_arxml3(self):
-        args = Args('tests/files/arxml/system-3.2.3.arxml')
-        args.print_buses = True
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
 
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_ARXML3_BUSES = """\
 Network:
   Baudrate: 250000
   CAN-FD enabled: False
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        args = Args('tests/files/arxml/system-3.2.3.arxml')
-        args.print_nodes = True
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_ARXML3_NODES = """\
 Driver:
   Comment[DE]: Der rätselhafte Fahrer
   Comment[EN]: The enigmatic driver
@@ -140,40 +110,14 @@ Passenger:
   Comment[DE]: Ein langweiliger Passagier
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-    def test_arxml4(self):
-        args = Args('tests/files/arxml/system-4.2.arxml')
-        args.print_nodes = True
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_ARXML4_NODES = """\
 DJ:
 Dancer:
   Comment[FOR-ALL]: Rhythm is a Dancer!
 Guard:
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        # Prepare mocks.
-        args = Args('tests/files/arxml/system-4.2.arxml')
-        args.items = ['Message2']
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_ARXML4_MESSAGE2 = """\
 Message2:
   Bus: Pch0
   Sending ECUs: Dancer
@@ -221,19 +165,7 @@ Message2:
         2: two
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        args = Args('tests/files/arxml/system-4.2.arxml')
-        args.items = ['AlarmStatus']
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_ARXML4_ALARM_STATUS = """\
 AlarmStatus:
   Bus: Pch0
   Sending ECUs: Guard
@@ -259,71 +191,24 @@ AlarmStatus:
       Is signed: False
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        args = Args('tests/files/arxml/system-4.2.arxml')
-        args.exclude_normal = True
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = 'Message2\n'
-
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        args = Args('tests/files/arxml/system-4.2.arxml')
-        args.exclude_extended = True
+_EXPECTED_ARXML4_EXCLUDE_NORMAL = 'Message2\n'
 
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
+_EXPECTED_ARXML4_EXCLUDE_EXTENDED_LINES = (
+    'AlarmStatus',
+    'Message1',
+    'Message3',
+    'Message4',
+    'MessageWithoutPDU',
+    'MultiplexedMessage',
+    'OneToContainThemAll',
+    '',
+)
 
-            # check make sure it behaves as expected
-            expected_output = """\
-AlarmStatus
-Message1
-Message3
-Message4
-MessageWithoutPDU
-MultiplexedMessage
-OneToContainThemAll
-"""
-
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        args = Args('tests/files/arxml/system-4.2.arxml')
-        args.items = [ 'IAmAGhost' ]
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_ARXML4_GHOST = """\
 No message named "IAmAGhost" has been found in input file.
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        args = Args('tests/files/arxml/system-4.2.arxml')
-        args.items = [ 'Message1' ]
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_ARXML4_MESSAGE1 = """\
 Message1:
   Comment[EN]: Comment1
   Comment[DE]: Kommentar1
@@ -404,19 +289,7 @@ Message1:
       Is signed: False
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        args = Args('tests/files/arxml/system-4.2.arxml')
-        args.items = [ "Message3" ]
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_ARXML4_MESSAGE3 = """\
 Message3:
   Bus: Pch0
   Sending ECUs: Dancer
@@ -479,19 +352,7 @@ Message3:
       Is signed: False
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        args = Args('tests/files/arxml/system-4.2.arxml')
-        args.print_buses = True
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_ARXML4_BUSES = """\
 Pch0:
   Comment[FOR-ALL]: The great CAN cluster
   Baudrate: 500000
@@ -499,23 +360,17 @@ Pch0:
   FD Baudrate: 2000000
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-
-    def test_kcd(self):
-        # Prepare mocks.
-        args = Args('tests/files/kcd/dump.kcd')
-        args.exclude_extended = True
-        args.print_all = True
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_ARXML4_CASES = (
+    ({'print_nodes': True}, _EXPECTED_ARXML4_NODES),
+    ({'items': ['Message2']}, _EXPECTED_ARXML4_MESSAGE2),
+    ({'items': ['AlarmStatus']}, _EXPECTED_ARXML4_ALARM_STATUS),
+    ({'exclude_normal': True}, _EXPECTED_ARXML4_EXCLUDE_NORMAL),
+    ({'items': ['Message1']}, _EXPECTED_ARXML4_MESSAGE1),
+    ({'items': ['Message3']}, _EXPECTED_ARXML4_MESSAGE3),
+    ({'print_buses': True}, _EXPECTED_ARXML4_BUSES),
+)
+
+_EXPECTED_KCD_NORMAL_ALL = """\
 Message1:
   Bus: Bus
   Sending ECUs: Node1
@@ -665,21 +520,7 @@ Message4:
       Is signed: False
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
-
-        # Prepare mocks.
-        args = Args('tests/files/kcd/dump.kcd')
-        args.exclude_normal = True
-        args.print_all = True
-
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
-
-            # check make sure it behaves as expected
-            expected_output = """\
+_EXPECTED_KCD_EXTENDED_ALL = """\
 Message3:
   Bus: Bus
   Frame ID: 0x3 (3)
@@ -700,25 +541,121 @@ Message3:
       Is signed: False
 """
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
+_EXPECTED_KCD_NONE = ''
+
+
+class CanToolsListTest(unittest.TestCase):
+
+    maxDiff = None
+
+    @classmethod
+    def setUpClass(cls):
+        # Parsed databases are cached per class and output is captured
+        # per test, so the tests share no process-global state and may
+        # be distributed over pytest-xdist workers (pytest -n auto).
+        cls._databases = {}
+        cls._load_file_patcher = patch('cantools.database.load_file',
+                                       cls._load_file_cached)
+        cls._load_file_patcher.start()
+        cls._stdout = StringIO()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._load_file_patcher.stop()
+
+    @classmethod
+    def _load_file_cached(cls, filename, **kwargs):
+        """Drop-in replacement for :func:`cantools.database.load_file()`
+        that parses each file only once per modification time for all
+        tests of the class.
+
+        """
 
-        # Prepare mocks.
-        args = Args('tests/files/kcd/dump.kcd')
-        args.exclude_normal = True
-        args.exclude_extended = True
-        args.print_all = True
+        path = os.path.realpath(filename)
+        key = (path, os.stat(path).st_mtime_ns, tuple(sorted(kwargs.items())))
 
-        stdout = StringIO()
-        with patch('sys.stdout', stdout):
-            # Run the main function of the subparser
-            list_module._do_list(args)
+        if key not in cls._databases:
+            cls._databases[key] = _load_file(filename, **kwargs)
 
-            # check make sure it behaves as expected
-            expected_output = ''
+        return cls._databases[key]
+
+    def setUp(self):
+        # The sub-cases derive their arguments from these with replace(),
+        # which also gives each of them its own items list.
+        self.args_motohawk = Args(_INPUT_MOTOHAWK)
+        self.args_arxml3 = Args(_INPUT_ARXML3)
+        self.args_arxml4 = Args(_INPUT_ARXML4)
+        self.args_kcd = Args(_INPUT_KCD)
+
+        # pytest restores sys.stdout after setUpClass() has run, so the
+        # class wide buffer is swapped in by each test instead.
+        stdout_patcher = patch('sys.stdout', self._stdout)
+        stdout_patcher.start()
+        self.addCleanup(stdout_patcher.stop)
+
+    def _run(self, args):
+        """Run the main function of the subparser and return what it
+        printed.
+
+        """
+
+        self._stdout.seek(0)
+        self._stdout.truncate(0)
+        list_module._do_list(args)
+
+        return self._stdout.getvalue()
+
+    def test_dbc(self):
+        args = replace(self.args_motohawk)
+        self.assertMultiLineEqual(self._run(args), _EXPECTED_MOTOHAWK)
+
+    @unittest.skipUnless(_FULL_TESTS, _FULL_TESTS_REASON)
+    def test_dbc_print_all(self):
+        args = replace(self.args_motohawk, print_all=True)
+        self.assertMultiLineEqual(self._run(args), _EXPECTED_MOTOHAWK_ALL)
+
+    @unittest.skipUnless(_FULL_TESTS, _FULL_TESTS_REASON)
+    def test_arxml3(self):
+        args = replace(self.args_arxml3, print_buses=True)
+        self.assertMultiLineEqual(self._run(args), _EXPECTED_ARXML3_BUSES)
+
+        args = replace(self.args_arxml3, print_nodes=True)
+        self.assertMultiLineEqual(self._run(args), _EXPECTED_ARXML3_NODES)
+
+    def test_arxml4_missing_message(self):
+        args = replace(self.args_arxml4, items=['IAmAGhost'])
+        self.assertMultiLineEqual(self._run(args), _EXPECTED_ARXML4_GHOST)
+
+    @unittest.skipUnless(_FULL_TESTS, _FULL_TESTS_REASON)
+    def test_arxml4(self):
+        for overrides, expected_output in _ARXML4_CASES:
+            with self.subTest(**overrides):
+                args = replace(self.args_arxml4, **overrides)
+                actual_output = self._run(args)
+                self.assertMultiLineEqual(actual_output, expected_output)
+
+    @unittest.skipUnless(_FULL_TESTS, _FULL_TESTS_REASON)
+    def test_arxml4_exclude_extended(self):
+        args = replace(self.args_arxml4, exclude_extended=True)
+        self.assertEqual(tuple(self._run(args).split('\n')),
+                         _EXPECTED_ARXML4_EXCLUDE_EXTENDED_LINES)
+
+    @unittest.skipUnless(_FULL_TESTS, _FULL_TESTS_REASON)
+    def test_kcd(self):
+        args = replace(self.args_kcd, exclude_extended=True, print_all=True)
+        self.assertMultiLineEqual(self._run(args), _EXPECTED_KCD_NORMAL_ALL)
+
+        args = replace(self.args_kcd, exclude_normal=True, print_all=True)
+        self.assertMultiLineEqual(self._run(args), _EXPECTED_KCD_EXTENDED_ALL)
+
+        args = replace(self.args_kcd,
+                       exclude_normal=True,
+                       exclude_extended=True,
+                       print_all=True)
+        self.assertMultiLineEqual(self._run(args), _EXPECTED_KCD_NONE)
 
-            actual_output = stdout.getvalue()
-            self.assertEqual(actual_output, expected_output)
 
 if __name__ == '__main__':
-    unittest.main()
+    import pytest
+
+    raise SystemExit(pytest.main(['-x', '--tb=short', __file__]))